@@ -1,74 +1,29 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from supabase import create_client, Client
-import traceback # Import traceback for detailed error logging
+import plotly.graph_objects as go
+
+from aqi_core import (
+    build_frame,
+    classify_aqi,
+    fetch_hourly_history,
+    get_hourly_history,
+    get_live_window,
+    get_supabase,
+    inject_css,
+    render_gauge,
+)
 
 # ==================================================
-# ☁ SUPABASE CONFIG (FROM secrets.toml)
+# ⚙ PAGE SETTINGS
 # ==================================================
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
+st.set_page_config(page_title="AQI Dashboard", layout="wide")
 
-# Initialize Supabase client
 try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    get_supabase()
 except Exception as e:
     st.error(f"Failed to initialize Supabase client. Check secrets configuration. Error: {e}")
     st.stop()
 
-
-# ==================================================
-# ⚙ PAGE SETTINGS
-# ==================================================
-st.set_page_config(page_title="AQI Dashboard", layout="wide")
-
-# ==================================================
-# 🌈 GLOBAL CSS
-# ==================================================
-st.markdown("""
-<style>
-    .aqi-bar-container { display: flex; height: 45px; border-radius: 10px; overflow: hidden; margin-top: 10px; }
-    .seg { flex: 1; text-align: center; font-weight: bold; padding-top: 12px; color: white; font-family: sans-serif; font-size: 14px; }
-
-    .good { background: #00e400; }
-    .moderate { background: #ffff00; color: black !important; }
-    .poor { background: #ff7e00; }
-    .unhealthy { background: #ff0000; }
-    .veryunhealthy { background: #8f3f97; }
-    .hazardous { background: #7e0023; }
-
-    .ticks { width: 100%; display: flex; justify-content: space-between; margin-top: 4px; font-size: 12px; color: #aaa; }
-    .big-aqi-value { font-size: 48px; font-weight: 800; text-align: center; margin-top: 15px; transition: color 0.5s ease; }
-    .status-text { font-size: 24px; text-align: center; margin-bottom: 10px; font-weight: bold; }
-</style>
-""", unsafe_allow_html=True)
-
-# ==================================================
-# 📥 FETCH LATEST DATA
-# ==================================================
-def get_latest_data(table_name, limit=200):
-    try:
-        response = (
-            supabase.table(table_name)
-            .select("*")
-            .order("id", desc=True)
-            .limit(limit)
-            .execute()
-        )
-        # CRITICAL CHECK: The Supabase Python client returns a NamedTuple
-        if hasattr(response, 'data') and response.data is not None:
-            return response.data
-        else:
-            st.warning(f"Query to {table_name} succeeded, but 'data' field was empty or missing.")
-            return []
-
-    except Exception as e:
-        # Display the error message and full traceback for debugging
-        st.error(f"🛑 Supabase Data Fetch Error from {table_name}")
-        st.code(f"Error Type: {type(e).__name__}\nMessage: {e}\n\nTraceback:\n{traceback.format_exc()}", language="python")
-        st.caption("If RLS is disabled, this might be a network or configuration issue.")
-        return []
+inject_css()
 
 # ==================================================
 # 🧭 SIDEBAR
@@ -82,41 +37,27 @@ choice = st.sidebar.radio("📌 Select View", ["Current Data", "Stored Data", "F
 @st.fragment(run_every=refresh_seconds)
 def show_live_monitor():
     # Fetch from 'realtime_data' table for live view
-    rows = get_latest_data("realtime_data", 50)
+    rows = get_live_window("realtime_data", 50)
     
     if not rows:
         st.info("Waiting for data from device (realtime_data), or check error message above...")
         return
 
-    df = pd.DataFrame(rows)
-    
-    # ✅ Fix for KeyError: 'Timestamp'
-    # Check which timestamp column exists and rename it
-    if "created_at" in df.columns:
-        df.rename(columns={"created_at": "Timestamp"}, inplace=True)
-    elif "updated_at" in df.columns:
-        df.rename(columns={"updated_at": "Timestamp"}, inplace=True)
+    # The window only changes when a new row arrives, so reuse the frame
+    # built on an earlier tick while last_ts stays the same
+    key = st.session_state["last_ts"]
+    if st.session_state.get("_live_key") == key:
+        df = st.session_state["_live_df"]
     else:
-        st.error(f"Missing timestamp column. Available columns: {list(df.columns)}")
-        return
-
-    # ✅ Robust timestamp parsing
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True, errors="coerce")
-    df = df.dropna(subset=["Timestamp"])  # Remove rows that failed to parse
-    
-    # Ensure to handle the timezone conversion correctly
-    try:
-        # First localize to UTC, then convert to Asia/Kolkata
-        df["Timestamp"] = df["Timestamp"].dt.tz_localize("UTC").dt.tz_convert("Asia/Kolkata")
-    except Exception:
-        # Fallback to plain timestamp if timezone conversion fails
-        df["Timestamp"] = df["Timestamp"].dt.tz_localize(None)
+        df = build_frame(rows)
+        st.session_state["_live_key"] = key
+        st.session_state["_live_df"] = df
 
     if df.empty:
         st.warning("No valid timestamp data available after cleanup.")
         return
 
-    latest = df.iloc[0]
+    latest = df.iloc[-1]
 
     # Added error check for AQI conversion in case 'aqi' column is missing or non-numeric
     try:
@@ -129,18 +70,7 @@ def show_live_monitor():
     hum = latest.get("humidity", "N/A")
 
     # 🔵 AQI Status Logic
-    if aqi <= 50: 
-        status, color = "Good", "#00e400"
-    elif aqi <= 100: 
-        status, color = "Moderate", "#ffff00"
-    elif aqi <= 150: 
-        status, color = "Poor", "#ff7e00"
-    elif aqi <= 200: 
-        status, color = "Unhealthy", "#ff0000"
-    elif aqi <= 300: 
-        status, color = "Very Unhealthy", "#8f3f97"
-    else: 
-        status, color = "Hazardous", "#7e0023"
+    status, color = classify_aqi(aqi)
 
     st.title("🌍 Live AQI Monitoring")
 
@@ -153,30 +83,12 @@ def show_live_monitor():
     st.caption(f"Last Updated: {latest['Timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
 
     # 🌈 AQI BAR
-    st.markdown(f"""
-    <div class="status-text">Current Status: {status}</div>
-
-    <div class="aqi-bar-container">
-        <div class="seg good">Good</div>
-        <div class="seg moderate">Moderate</div>
-        <div class="seg poor">Poor</div>
-        <div class="seg unhealthy">Unhealthy</div>
-        <div class="seg veryunhealthy">Very Unhealthy</div>
-        <div class="seg hazardous">Hazardous</div>
-    </div>
-
-    <div class="ticks">
-        <span>0</span><span>50</span><span>100</span><span>150</span>
-        <span>200</span><span>300</span><span>300+</span>
-    </div>
-
-    <div class="big-aqi-value" style="color:{color};">{aqi} AQI</div>
-    """, unsafe_allow_html=True)
+    render_gauge(aqi, status, color)
 
     st.subheader("📈 Live AQI Trend")
-    df_sorted = df.sort_values("Timestamp")
-    fig = px.line(df_sorted, x="Timestamp", y="aqi", markers=True)
-    st.plotly_chart(fig, use_container_width=True)
+    # The live window is already ordered oldest -> newest by timestamp.
+    # st.line_chart is much lighter to rebuild each tick than a Plotly figure.
+    st.line_chart(df, x="Timestamp", y="aqi", use_container_width=True)
 
 # ==================================================
 # 📁 STORED DATA PAGE
@@ -184,48 +96,37 @@ def show_live_monitor():
 def show_history():
     st.title("📊 Historical AQI Data")
 
-    # Fetch from 'sensor_data' table for historical view
-    rows = get_latest_data("sensor_data", 1000)
+    # Drop the cached history so the fetch below goes back to Supabase
+    if st.button("🔄 Refresh Data"):
+        fetch_hourly_history.clear()
+
+    # Hourly averages of the last 7 days from 'sensor_data'
+    rows = get_hourly_history(168)
     
     if not rows:
         st.warning("No data available in 'sensor_data' table.")
         return
 
-    df = pd.DataFrame(rows)
-    
-    # ✅ Fix for potential missing timestamp in sensor_data as well
-    if "created_at" in df.columns:
-        df.rename(columns={"created_at": "Timestamp"}, inplace=True)
-    elif "updated_at" in df.columns:
-        df.rename(columns={"updated_at": "Timestamp"}, inplace=True)
-    else:
-        st.error(f"Missing timestamp column. Available columns: {list(df.columns)}")
-        return
-
-    # ✅ Robust timestamp parsing
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"], utc=True, errors="coerce")
-    df = df.dropna(subset=["Timestamp"])
-    
-    # Ensure to handle the timezone conversion correctly
-    try:
-        # First localize to UTC, then convert to Asia/Kolkata
-        df["Timestamp"] = df["Timestamp"].dt.tz_localize("UTC").dt.tz_convert("Asia/Kolkata")
-    except Exception:
-        df["Timestamp"] = df["Timestamp"].dt.tz_localize(None)
+    df = build_frame(rows)
 
     if df.empty:
         st.warning("No valid timestamp data available after cleanup.")
         return
 
-    df_sorted = df.sort_values("Timestamp")
-
-    st.subheader("📈 AQI, Temperature & Humidity Trends")
-    fig = px.line(df_sorted, x="Timestamp", y=["aqi", "temperature", "humidity"])
-    st.plotly_chart(fig, use_container_width=True)
-
-    st.subheader("📄 Data Table")
+    # Rows arrive already bucketed and ordered by hour
+    st.subheader("📈 Hourly AQI, Temperature & Humidity Trends")
+    # WebGL traces keep pan/zoom fast for long history windows
+    fig = go.Figure([
+        go.Scattergl(x=df["Timestamp"], y=df[col], mode="lines", name=col)
+        for col in ("aqi", "temperature", "humidity")
+    ])
+    # A constant uirevision keeps zoom/legend state when the figure is rebuilt
+    fig.update_layout(uirevision="history")
+    st.plotly_chart(fig, use_container_width=True, key="history_chart")
+
+    st.subheader("📄 Hourly Averages")
     # Display the table with the correctly formatted timestamp
-    st.dataframe(df_sorted.set_index("Timestamp"), use_container_width=True)
+    st.dataframe(df.set_index("Timestamp"), use_container_width=True)
 
 # ==================================================
 # 🔮 FUTURE PREDICTION
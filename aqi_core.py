@@ -0,0 +1,333 @@
+# Shared Supabase access, AQI levels and gauge markup for the dashboard views.
+# Streamlit caches here are process-wide, so every entrypoint importing this
+# module reuses the same client, pool and cached reads.
+import streamlit as st
+import pandas as pd
+import numpy as np
+from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from psycopg import OperationalError, sql
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool, PoolTimeout
+import traceback # Import traceback for detailed error logging
+import logging
+import threading
+import time
+from collections import deque
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# ==================================================
+# ☁ SUPABASE CONFIG (FROM secrets.toml)
+# ==================================================
+SUPABASE_URL = st.secrets["SUPABASE_URL"]
+SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
+
+# Initialize Supabase client once per process and reuse it across reruns
+@st.cache_resource
+def get_supabase() -> Client:
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Optional direct Postgres connection (Supavisor pooler, port 6543) for the
+# live hot path. Enabled only when SUPABASE_DB_URL is set; otherwise, or for
+# DB_POOL_COOLDOWN after the pool fails a query, reads go through the REST
+# client above.
+SUPABASE_DB_URL = st.secrets.get("SUPABASE_DB_URL")
+# Seconds to wait for a pooled connection before falling back to REST
+DB_POOL_TIMEOUT = 2
+# After a pool failure, skip the pool for this long so each live tick does not
+# wait DB_POOL_TIMEOUT again before falling back
+DB_POOL_COOLDOWN = 300
+
+@st.cache_resource
+def get_db_pool():
+    if not SUPABASE_DB_URL:
+        return None
+    return ConnectionPool(
+        SUPABASE_DB_URL,
+        min_size=2,
+        max_size=10,
+        open=True,
+        # Supavisor's transaction mode does not support prepared statements
+        kwargs={"row_factory": dict_row, "prepare_threshold": None},
+    )
+
+# Process-wide: time.monotonic() before which the pool is not used
+_pool_retry_at = 0.0
+_pool_lock = threading.Lock()
+
+def _get_live_pool():
+    if time.monotonic() < _pool_retry_at:
+        return None
+    return get_db_pool()
+
+def _disable_pool(pool, e):
+    global _pool_retry_at
+    with _pool_lock:
+        if time.monotonic() < _pool_retry_at:
+            return  # another session already disabled it
+        _pool_retry_at = time.monotonic() + DB_POOL_COOLDOWN
+    logger.warning(
+        "Postgres pool unavailable (%s: %s); using the REST API for %ss. Check SUPABASE_DB_URL.",
+        type(e).__name__, e, DB_POOL_COOLDOWN,
+    )
+    # Stop the pool's background reconnect attempts; a fresh pool is created
+    # on the first query after the cooldown
+    get_db_pool.clear()
+    pool.close()
+
+# ==================================================
+# 🌈 GLOBAL CSS
+# ==================================================
+CSS = """
+<style>
+    .aqi-bar-container { display: flex; height: 45px; border-radius: 10px; overflow: hidden; margin-top: 10px; }
+    .seg { flex: 1; text-align: center; font-weight: bold; padding-top: 12px; color: white; font-family: sans-serif; font-size: 14px; }
+
+    .good { background: #00e400; }
+    .moderate { background: #ffff00; color: black !important; }
+    .poor { background: #ff7e00; }
+    .unhealthy { background: #ff0000; }
+    .veryunhealthy { background: #8f3f97; }
+    .hazardous { background: #7e0023; }
+
+    .ticks { width: 100%; display: flex; justify-content: space-between; margin-top: 4px; font-size: 12px; color: #aaa; }
+    .big-aqi-value { font-size: 48px; font-weight: 800; text-align: center; margin-top: 15px; transition: color 0.5s ease; }
+    .status-text { font-size: 24px; text-align: center; margin-bottom: 10px; font-weight: bold; }
+</style>
+"""
+
+# Static part of the AQI gauge; only the status and value change per tick
+GAUGE_STATIC_HTML = """
+<div class="aqi-bar-container">
+    <div class="seg good">Good</div>
+    <div class="seg moderate">Moderate</div>
+    <div class="seg poor">Poor</div>
+    <div class="seg unhealthy">Unhealthy</div>
+    <div class="seg veryunhealthy">Very Unhealthy</div>
+    <div class="seg hazardous">Hazardous</div>
+</div>
+<div class="ticks">
+    <span>0</span><span>50</span><span>100</span><span>150</span>
+    <span>200</span><span>300</span><span>300+</span>
+</div>
+"""
+
+# Call once per full script run, outside any fragment
+def inject_css():
+    st.markdown(CSS, unsafe_allow_html=True)
+
+def render_gauge(aqi, status, color):
+    st.markdown(
+        f'<div class="status-text">Current Status: {status}</div>'
+        + GAUGE_STATIC_HTML
+        + f'<div class="big-aqi-value" style="color:{color};">{aqi} AQI</div>',
+        unsafe_allow_html=True,
+    )
+
+# ==================================================
+# 📥 FETCH LATEST DATA
+# ==================================================
+# Cache lifetimes (seconds). The live TTL matches the smallest refresh interval
+# so the live view still updates at the slider cadence.
+LIVE_CACHE_TTL = 2
+HISTORY_CACHE_TTL = 60
+# st.cache_data is shared by every session in the process; cap the entries
+# since each live session adds a key per new last_ts
+LIVE_CACHE_MAX_ENTRIES = 32
+HISTORY_CACHE_MAX_ENTRIES = 8
+
+# Only the columns the dashboard reads, to keep PostgREST payloads small.
+# The table's timestamp column is added per table and returned as "ts".
+VALUE_COLUMNS = ("aqi", "temperature", "humidity")
+
+# A table may have either timestamp column (the live view has always accepted
+# both). updated_at wins when both exist: it is the live delta key, and an
+# upsert in place only moves updated_at, never created_at. A table with only
+# created_at must be insert-only for the live view to see new readings.
+TIMESTAMP_CANDIDATES = ("updated_at", "created_at")
+
+# Probed once per process. PostgREST answers 42703 for an unknown column;
+# any other error is raised, and exceptions are not cached.
+@st.cache_resource(show_spinner=False)
+def get_ts_column(table_name):
+    supabase = get_supabase()
+    for column in TIMESTAMP_CANDIDATES:
+        try:
+            supabase.table(table_name).select(column).limit(1).execute()
+            return column
+        except APIError as e:
+            if e.code != "42703":
+                raise
+    raise LookupError(f"{table_name} has none of the timestamp columns {TIMESTAMP_CANDIDATES}")
+
+def _query_rows_pg(pool, table_name, limit, after_ts=None):
+    ts_column = sql.Identifier(get_ts_column(table_name))
+    columns = sql.SQL(", ").join(
+        [sql.Identifier("id"), sql.SQL("{} as ts").format(ts_column)]
+        + [sql.Identifier(c) for c in VALUE_COLUMNS]
+    )
+    if after_ts is None:
+        query = sql.SQL("select {} from {} order by {} desc limit %s").format(columns, sql.Identifier(table_name), ts_column)
+        params = (limit,)
+    else:
+        query = sql.SQL("select {} from {} where {} > %s order by {} limit %s").format(columns, sql.Identifier(table_name), ts_column, ts_column)
+        params = (after_ts, limit)
+    with pool.connection(timeout=DB_POOL_TIMEOUT) as conn:
+        return conn.execute(query, params).fetchall()
+
+def _query_rows(table_name, limit, after_ts=None):
+    pool = _get_live_pool()
+    if pool is not None:
+        try:
+            return _query_rows_pg(pool, table_name, limit, after_ts)
+        except (OperationalError, PoolTimeout) as e:
+            # Pooler unreachable or misconfigured: use the REST client below
+            _disable_pool(pool, e)
+
+    supabase = get_supabase()
+    ts_column = get_ts_column(table_name)
+    columns = ",".join(("id", f"ts:{ts_column}") + VALUE_COLUMNS)
+    query = supabase.table(table_name).select(columns)
+    if after_ts is None:
+        # Newest rows first
+        query = query.order(ts_column, desc=True)
+    else:
+        # Only rows written after after_ts, oldest first (keyset pagination)
+        query = query.gt(ts_column, after_ts).order(ts_column)
+    response = query.limit(limit).execute()
+    # CRITICAL CHECK: The Supabase Python client returns a NamedTuple
+    return getattr(response, "data", None)
+
+# Exceptions are not cached, so a failed fetch is retried on the next rerun
+@st.cache_data(ttl=LIVE_CACHE_TTL, max_entries=LIVE_CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_live_rows(table_name, limit, after_ts=None):
+    return _query_rows(table_name, limit, after_ts)
+
+# Hourly averages are computed in Postgres by the hourly_aqi() function
+# (see sql/hourly_aqi.sql), so only one row per hour crosses the network.
+@st.cache_data(ttl=HISTORY_CACHE_TTL, max_entries=HISTORY_CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_hourly_history(hours):
+    supabase = get_supabase()
+    response = supabase.rpc("hourly_aqi", {"n": hours}).execute()
+    return getattr(response, "data", None)
+
+def _report_fetch_error(source, e):
+    # Display the error message and full traceback for debugging
+    st.error(f"🛑 Supabase Data Fetch Error from {source}")
+    st.code(f"Error Type: {type(e).__name__}\nMessage: {e}\n\nTraceback:\n{traceback.format_exc()}", language="python")
+    st.caption("If RLS is disabled, this might be a network or configuration issue.")
+
+def get_latest_data(table_name, limit=200, after_ts=None):
+    try:
+        data = fetch_live_rows(table_name, limit, after_ts)
+        if data is not None:
+            return data
+        else:
+            st.warning(f"Query to {table_name} succeeded, but 'data' field was empty or missing.")
+            return []
+
+    except Exception as e:
+        _report_fetch_error(table_name, e)
+        return []
+
+# Keeps the last `size` rows (oldest first) in session state and, after the
+# first run, only asks Supabase for rows written after the newest one seen.
+# The delta is keyed on the timestamp column (see TIMESTAMP_CANDIDATES) rather
+# than id, so rows upserted in place are picked up when updated_at exists.
+def get_live_window(table_name, size=50):
+    if "buf" not in st.session_state:
+        st.session_state["buf"] = deque(maxlen=size)
+        st.session_state["last_ts"] = None
+
+    buf = st.session_state["buf"]
+    rows = []
+    if st.session_state["last_ts"] is not None:
+        rows = get_latest_data(table_name, size, after_ts=st.session_state["last_ts"])
+        if len(rows) >= size:
+            # A full page means we fell behind (idle view, pause, burst);
+            # the oldest-first delta would replay stale rows, so reseed
+            buf.clear()
+            st.session_state["last_ts"] = None
+        elif rows:
+            # Drop older copies of rows that were updated in place
+            new_ids = {r["id"] for r in rows}
+            if any(r["id"] in new_ids for r in buf):
+                buf = deque((r for r in buf if r["id"] not in new_ids), maxlen=size)
+                st.session_state["buf"] = buf
+            # maxlen drops the oldest rows in O(1), no list.pop(0) shifting
+            buf.extend(rows)
+            st.session_state["last_ts"] = rows[-1]["ts"]
+
+    if st.session_state["last_ts"] is None:
+        # Seed the buffer with the latest window. Rows arrive newest first,
+        # so extendleft() leaves them oldest first without a reversed copy.
+        rows = get_latest_data(table_name, size)
+        if rows:
+            buf.extendleft(rows)
+            st.session_state["last_ts"] = rows[0]["ts"]
+    return list(buf)
+
+def get_hourly_history(hours=168):
+    try:
+        data = fetch_hourly_history(hours)
+        if data is not None:
+            return data
+        else:
+            st.warning("Call to hourly_aqi succeeded, but 'data' field was empty or missing.")
+            return []
+
+    except Exception as e:
+        _report_fetch_error("hourly_aqi", e)
+        return []
+
+# ==================================================
+# 🔵 AQI LEVELS
+# ==================================================
+# Upper bound (inclusive) of each level; anything above 300 is Hazardous
+AQI_BREAKS = (50, 100, 150, 200, 300)
+AQI_LEVELS = (
+    ("Good", "#00e400"),
+    ("Moderate", "#ffff00"),
+    ("Poor", "#ff7e00"),
+    ("Unhealthy", "#ff0000"),
+    ("Very Unhealthy", "#8f3f97"),
+    ("Hazardous", "#7e0023"),
+)
+
+def classify_aqi(aqi):
+    # bisect_left keeps the bounds inclusive (50 -> Good, 51 -> Moderate)
+    return AQI_LEVELS[bisect_left(AQI_BREAKS, aqi)]
+
+# ==================================================
+# 🧮 DATAFRAME BUILD
+# ==================================================
+# Builds the frame column by column from typed arrays rather than from the
+# list of dicts, which skips pandas' per-row dict and dtype inference.
+# Missing readings (None) become NaN. The columns stay float64: these values
+# are shown as-is in metrics, tables and hover text, where float32 would turn
+# 23.4 into 23.399999618530273.
+def build_frame(rows, ts_key="ts"):
+    # ✅ Robust timestamp parsing: Supabase sends ISO 8601, already UTC-aware
+    ts = pd.to_datetime([r[ts_key] for r in rows], utc=True, errors="coerce", format="ISO8601").tz_convert("Asia/Kolkata")
+    df = pd.DataFrame({
+        "Timestamp": ts,
+        "aqi": np.array([r.get("aqi") for r in rows], dtype=np.float64),
+        "temperature": np.array([r.get("temperature") for r in rows], dtype=np.float64),
+        "humidity": np.array([r.get("humidity") for r in rows], dtype=np.float64),
+    })
+    df = df.dropna(subset=["Timestamp"])  # Remove rows that failed to parse
+    return _downcast(df)
+
+# AQI readings are whole numbers in 0-500, so int16 is enough. Hourly
+# averages, missing readings and out-of-range values (e.g. a 65535 sensor
+# sentinel, which astype() would silently wrap to -1) stay float64.
+INT16_RANGE = np.iinfo(np.int16)
+
+def _downcast(df):
+    aqi = df["aqi"]
+    if (aqi.notna().all() and (aqi % 1 == 0).all()
+            and aqi.between(INT16_RANGE.min, INT16_RANGE.max).all()):
+        df["aqi"] = aqi.astype(np.int16)
+    return df
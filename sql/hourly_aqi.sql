@@ -0,0 +1,18 @@
+-- Hourly averages over the last n hours of sensor_data.
+-- Called from the dashboard's history view via supabase.rpc("hourly_aqi", {"n": 168}).
+create or replace function hourly_aqi(n int)
+returns table(ts timestamptz, aqi float, temperature float, humidity float)
+language sql stable
+as $$
+    select date_trunc('hour', created_at) as ts,
+           avg(aqi)::float,
+           avg(temperature)::float,
+           avg(humidity)::float
+    from sensor_data
+    where created_at > now() - make_interval(hours => n)
+    group by 1
+    order by 1
+$$;
+
+-- Lets the time filter above use an index range scan.
+create index if not exists sensor_data_created_at_idx on sensor_data (created_at);